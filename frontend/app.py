@@ -1,17 +1,36 @@
 import streamlit as st
 from src.agent_orchestrator.agent import DataAnalysisAgent
-from src.llm_handler.data_analysis import DataAnalysisEngine
 from src.file_processing.process_file import FileProcessor
 import os 
 import tempfile
-import base64
-from io import BytesIO
+from collections import deque
+
+# Number of past queries rendered in the conversation history
+MAX_CONVERSATION_ITEMS = 50
+
+
+# Keyed on the file name (which picks the parser) and its bytes. The result is pickled,
+# so every rerun gets its own copy and no hash_funcs are needed for the DataFrames inside.
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_process(name: str, blob: bytes) -> dict:
+    """Process an uploaded file once per (name, content) pair across reruns"""
+    # Create a temporary file
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(name)[1]) as tmp_file:
+        tmp_file.write(blob)
+        tmp_path = tmp_file.name
+
+    try:
+        return FileProcessor().process_file(tmp_path)
+    finally:
+        # Clean up the temporary file
+        os.unlink(tmp_path)
+
 
 # Initialize session state variables
 if 'agent' not in st.session_state:
     st.session_state.agent = DataAnalysisAgent()
 if 'conversation' not in st.session_state:
-    st.session_state.conversation = []
+    st.session_state.conversation = deque(maxlen=MAX_CONVERSATION_ITEMS)
 
 # Set up the main page
 st.set_page_config(page_title="Data Analysis Assistant", layout="wide")
@@ -20,25 +39,19 @@ st.title("Data Analysis Assistant")
 # Sidebar for file upload
 with st.sidebar:
     st.header("Upload Data")
-    uploaded_file = st.file_uploader("Choose a file", type=['csv', 'xlsx', 'json', 'txt'])
+    uploaded_file = st.file_uploader("Choose a file", type=['csv', 'xlsx', 'json', 'jsonl', 'ndjson', 'txt', 'pdf'])
     
     if uploaded_file is not None:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
-        
         try:
-            # Process the file
+            # Process the file (memoized on name + bytes, so reruns skip the parse)
             file_id = uploaded_file.name
-            processed_data = st.session_state.agent.process_file(tmp_path, file_id)
+            with st.spinner("Parsing..."):
+                processed_data = _cached_process(uploaded_file.name, uploaded_file.getvalue())
+            st.session_state.agent.data_analysis_engine.add_data(processed_data, file_id)
             st.session_state.agent.files[file_id] = processed_data
             st.success(f"File '{file_id}' processed successfully!")
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")
-        finally:
-            # Clean up the temporary file
-            os.unlink(tmp_path)
     
     # Display currently loaded files
     if st.session_state.agent.files:
@@ -55,20 +68,23 @@ query = st.text_input("Enter your question or visualization request:", placehold
 if query:
     try:
         # Get response from agent
-        response = st.session_state.agent.ask(query)
-        
-        # Add to conversation history
-        st.session_state.conversation.append({"query": query, "response": response})
+        with st.spinner("Thinking..."):
+            response = st.session_state.agent.ask(query)
         
         # Display response
         if response['type'] == 'visualization':
-            # Convert base64 string to bytes
-            image_bytes = base64.b64decode(response['data']['figure'])
-            # Display image from bytes
+            # Display image from raw bytes
+            image_bytes = response['data']['figure']
             st.image(image_bytes)
             st.write(response['message'])
-        else:
+        elif isinstance(response['message'], str):
             st.write(response['message'])
+        else:
+            # Render tokens as they are generated, keep the full text for the history
+            response['message'] = st.write_stream(response['message'])
+
+        # Add to conversation history
+        st.session_state.conversation.append({"query": query, "response": response})
             
     except Exception as e:
         st.error(f"Error processing query: {str(e)}")
@@ -79,8 +95,6 @@ if st.session_state.conversation:
     for item in reversed(st.session_state.conversation):
         with st.expander(f"Q: {item['query']}", expanded=False):
             if item['response']['type'] == 'visualization':
-                base64_image = item['response']['data']['figure']
-                image_bytes = base64.b64decode(base64_image)
-                st.image(image_bytes)
+                st.image(item['response']['data']['figure'])
             st.write(item['response']['message'])
 
@@ -1,19 +1,51 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator
 import os 
 import json
+import re
+from collections import deque
 from src.file_processing.process_file import FileProcessor
 from src.llm_handler.data_analysis import DataAnalysisEngine
 from src.visualization.visualization import VisualizationEngine
 from src.config.settings import settings
 from loguru import logger
 
+# Words that mark a query as a visualization request, plural and compound forms are
+# listed explicitly so words that merely start the same ("linear", "pieces") do not match
+_VIZ_RE = re.compile(
+    r"\b(?:plot(?:s|ted|ting)?|charts?|graphs?|visuali[sz](?:e|es|ed|ing|ations?)|histograms?|"
+    r"lines?|lineplots?|bars?|barplots?|barcharts?|pies?|piecharts?|scatter|scatterplots?|"
+    r"boxplots?|heatmaps?)\b",
+    re.IGNORECASE
+)
+
+# Number of messages (user and assistant turns) kept in the conversation history
+MAX_HISTORY_MESSAGES = 16
+
+# JSON schema the LLM output is constrained to when parsing visualization requests
+_VIZ_PARAMS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {
+            "type": "string",
+            "enum": ["bar", "line", "scatter", "pie", "histogram", "heatmap", "boxplot"]
+        },
+        "x_column": {"type": "string"},
+        "y_column": {"type": ["string", "null"]},
+        "category_column": {"type": ["string", "null"]},
+        "title": {"type": "string"},
+        "file_id": {"type": "string"}
+    },
+    "required": ["type", "x_column", "y_column", "category_column", "title", "file_id"]
+}
+
 class DataAnalysisAgent:
     def __init__(self, upload_dir: str = './uploads'):
         self.file_processor = FileProcessor()
         self.data_analysis_engine = DataAnalysisEngine()
         self.visualization_engine = VisualizationEngine()
         self.upload_dir = upload_dir
-        self.conversation_history = []
+        # Sliding window so the history cannot grow without bound
+        self.conversation_history = deque(maxlen=MAX_HISTORY_MESSAGES)
         self.files = {}
 
     def process_file(self, file_path: str, file_id: str) -> Dict[str, Any]:
@@ -38,14 +70,12 @@ class DataAnalysisAgent:
         })
 
         # Get default file_id (first file if available)
-        file_id = list(self.files.keys())[0] if self.files else None
+        file_id = next(iter(self.files), None)
         if not file_id:
             raise ValueError("No files have been processed yet")
 
         # Check if query is a visualization request
-        viz_keywords = ["plot", "chart", "graph", "visualize", "visualization",
-                        "histogram", "line", "bar", "pie", "scatter", "boxplot"]
-        viz_request = any(keyword in query.lower() for keyword in viz_keywords)
+        viz_request = _VIZ_RE.search(query) is not None
 
         if viz_request:
             # Use LLM to parse visualization request
@@ -65,9 +95,10 @@ class DataAnalysisAgent:
                     y_column=viz_params.get('y_column'),
                     category_column=viz_params.get('category_column'),
                     title=viz_params.get('title'),
-                    engine='seaborn'
+                    engine='seaborn',
+                    numeric_columns=self.data_analysis_engine.numeric_columns.get(viz_file_id)
                 )
-                print(viz_result)
+                logger.info(f"Generated {viz_result['type']} visualization ({len(viz_result['figure'])} bytes)")
                 # Add visualization to response
                 response = {
                     'type': 'visualization',
@@ -80,15 +111,17 @@ class DataAnalysisAgent:
                     'message': f"File {viz_file_id} not found or no data available for visualization"
                 }
         else:
-            # Perform data analysis
-            response = self.data_analysis_engine.analyze_data(
+            # Perform data analysis, streamed so the caller can render tokens as they arrive
+            chunks = self.data_analysis_engine.analyze_data(
                 file_ids=[file_id],
-                query=query
+                query=query,
+                stream=True
             )
 
-            response = {
+            # The assistant turn is recorded once the stream has been consumed
+            return {
                 'type': 'text',
-                'message': response
+                'message': self._record_stream(chunks)
             }
 
         # Add response to conversation history
@@ -99,6 +132,18 @@ class DataAnalysisAgent:
 
         return response
 
+    def _record_stream(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Pass through streamed chunks and add the full text to the conversation history"""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": "".join(parts)
+        })
+
     def _parse_visualization_request(self, query: str) -> Dict[str, Any]:
         """Parse the visualization request details from the query"""
         prompt = f"""You are a visualization parameter extractor. Your task is to extract visualization parameters from the user's query and return them in a specific JSON format.
@@ -129,20 +174,8 @@ class DataAnalysisAgent:
 
         try:
             logger.info(f"Parsing visualization request: {query}")
-            response = self.data_analysis_engine.llm.invoke(prompt)
-            response_text = response.content if hasattr(response, 'content') else str(response)
-            
-            # Clean the response text to ensure it's valid JSON
-            # Remove any potential markdown formatting or extra text
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
+            # Structured output makes Ollama constrain decoding to the schema
+            response_text = self.data_analysis_engine.chat(prompt, format=_VIZ_PARAMS_SCHEMA)
             logger.info(f"Parsed response: {response_text}")
             return json.loads(response_text)
         except Exception as e:
@@ -154,7 +187,7 @@ class DataAnalysisAgent:
                 'y_column': None,
                 'category_column': None,
                 'title': None,
-                'file_id': list(self.files.keys())[0] if self.files else None
+                'file_id': next(iter(self.files), None)
             }
             
             # Try to extract some basic parameters from the query
@@ -190,11 +223,14 @@ if __name__ == "__main__":
             break
         response = agent.ask(query=query)
         if response['type'] == 'visualization':
-            with open('output.png', 'wb') as f:
-                f.write(response['data'])
-            print("Visualization saved as output.png")
+            output_path = f"output.{response['data']['format']}"
+            with open(output_path, 'wb') as f:
+                f.write(response['data']['figure'])
+            print(f"Visualization saved as {output_path}")
         else:
-            print(response['message'])
+            for chunk in response['message']:
+                print(chunk, end='', flush=True)
+            print()
 
 
 
@@ -0,0 +1,116 @@
+from typing import Optional, Tuple, Callable
+from functools import lru_cache
+import threading
+import pandas as pd
+import numpy as np
+from loguru import logger
+
+# Frames smaller than this (rows x columns) are left to pandas, the JIT compile is not worth it
+NUMBA_DUPLICATE_MIN_CELLS = 1_000_000
+
+_FNV_OFFSET = np.uint64(14695981039346656037)
+_FNV_PRIME = np.uint64(1099511628211)
+
+# numba's default 'workqueue' threading layer aborts the process on concurrent
+# parallel launches, and callers run from worker pools, so kernels run one at a time
+_KERNEL_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_kernels() -> Optional[Tuple[Callable, Callable]]:
+    """Import numba and compile the kernels on first use, None if numba is not installed"""
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(parallel=True, cache=True)
+    def _row_hashes(bits):
+        """FNV-1a hash of every row of a uint64 matrix, rows hashed in parallel"""
+        n_rows, n_cols = bits.shape
+        hashes = np.empty(n_rows, dtype=np.uint64)
+        for i in prange(n_rows):
+            h = _FNV_OFFSET
+            for j in range(n_cols):
+                h = (h ^ bits[i, j]) * _FNV_PRIME
+            hashes[i] = h
+        return hashes
+
+    @njit(cache=True)
+    def _count_duplicates(bits, hashes, order):
+        """Count rows equal to an earlier row, comparing rows exactly within each hash bucket"""
+        n_rows, n_cols = bits.shape
+        duplicates = 0
+        start = 0
+        while start < n_rows:
+            end = start + 1
+            while end < n_rows and hashes[order[end]] == hashes[order[start]]:
+                end += 1
+
+            if end - start > 1:
+                # Distinct rows seen so far in this bucket, guards against hash collisions
+                representatives = [order[start]]
+                for k in range(start + 1, end):
+                    row = order[k]
+                    found = False
+                    for rep in representatives:
+                        equal = True
+                        for j in range(n_cols):
+                            if bits[row, j] != bits[rep, j]:
+                                equal = False
+                                break
+                        if equal:
+                            found = True
+                            break
+                    if found:
+                        duplicates += 1
+                    else:
+                        representatives.append(row)
+            start = end
+        return duplicates
+
+    return _row_hashes, _count_duplicates
+
+
+def _to_row_bits(df: pd.DataFrame) -> np.ndarray:
+    """Encode each column as 64-bit patterns so equal values (pandas semantics) have equal bits"""
+    # Column-major so every column is written with one contiguous copy
+    bits = np.empty(df.shape, dtype=np.uint64, order='F')
+    for j, (_, column) in enumerate(df.items()):
+        values = column.to_numpy()
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float64)
+            # Canonical NaN and +0.0, pandas treats all NaNs and both zeros as equal
+            values = np.where(np.isnan(values), np.nan, values) + 0.0
+            bits[:, j] = values.view(np.uint64)
+        elif values.dtype.kind == 'u':
+            bits[:, j] = values.astype(np.uint64)
+        else:
+            bits[:, j] = values.astype(np.int64).view(np.uint64)
+    return bits
+
+
+def count_duplicate_rows(df: pd.DataFrame) -> Optional[int]:
+    """Count duplicate rows of a large, purely numeric frame with a parallel numba kernel
+
+    Returns None when the frame is not eligible (numba missing, frame too small
+    or any non-numeric/extension column), so the caller can fall back to pandas.
+    """
+    if df.size < NUMBA_DUPLICATE_MIN_CELLS:
+        return None
+    if not all(isinstance(dtype, np.dtype) and dtype.kind in 'iuf' for dtype in df.dtypes):
+        return None
+
+    kernels = _load_kernels()
+    if kernels is None:
+        return None
+    row_hashes, count_duplicates = kernels
+
+    try:
+        bits = _to_row_bits(df)
+        with _KERNEL_LOCK:
+            hashes = row_hashes(bits)
+            return int(count_duplicates(bits, hashes, np.argsort(hashes)))
+    except Exception as e:
+        logger.error(f"Error counting duplicates with numba: {e}")
+        return None
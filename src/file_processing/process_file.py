@@ -1,16 +1,26 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import pandas as pd
 import numpy as np 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
-import PyPDF2
+from src.file_processing.duplicates import count_duplicate_rows
+
+# Row count above which the duplicate-row check is skipped in summaries
+MAX_DUPLICATE_CHECK_ROWS = 1_000_000
+# Maximum number of numeric columns (highest std first) kept in the summary stats
+MAX_STATS_COLUMNS = 20
+# Categorical columns with fewer distinct values than this are stored as pandas Categorical
+MAX_CATEGORY_CARDINALITY = 1000
+# Upper bound on threads used to read Excel sheets in parallel
+MAX_EXCEL_WORKERS = 8
 
 
 class FileProcessor:
     """Base class for file processing"""
 
     def __init__(self):
-        self.supported_extensions = ['.csv', '.xlsx', '.xls', '.txt', '.doc', '.docx', '.pdf', '.json']
+        self.supported_extensions = ['.csv', '.xlsx', '.xls', '.txt', '.doc', '.docx', '.pdf', '.json', '.jsonl', '.ndjson']
 
     def process_file(self, file_path: str):
         """Process a  file with its respective extension"""
@@ -28,7 +38,7 @@ class FileProcessor:
             return self._process_doc(file_path)
         elif extension == '.pdf':
             return self._process_pdf(file_path)
-        elif extension == '.json':
+        elif extension == '.json' or extension == '.jsonl' or extension == '.ndjson':
             return self._process_json(file_path)
         else:
             raise ValueError(f"Unsupported file extension: {extension}")
@@ -36,14 +46,14 @@ class FileProcessor:
     def _process_csv(self, file_path: str) -> Dict[str, Any]:
         """Process a CSV file and return a dictionary"""
         try:
-            df = pd.read_csv(file_path)
+            df = self._read_csv(file_path)
             logger.info(f"Successfully processed CSV file from path: {file_path}")
             return {
                 'data': df,
                 'metadata': {
                     'rows': df.shape[0],
                     'columns': df.shape[1],
-                    'dtypes': {col: dtype for col, dtype in df.dtypes.items()},
+                    'dtypes': df.dtypes.astype(str).to_dict(),
                     'summary': self._get_summary(df)
                 },
                 
@@ -55,42 +65,61 @@ class FileProcessor:
     def _process_excel(self, file_path: str) -> Dict[str, Any]:
         """Process an Excel file and return a dictionary"""
         try:
-            excel_file = pd.ExcelFile(file_path)
-            sheets = {}
-
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(excel_file, sheet_name=sheet_name)
-                sheets[sheet_name] = {
-                    'data': df, 
-                    'metadata': {
-                        'rows': df.shape[0],
-                        'columns': df.shape[1],
-                        'dtypes': {col: dtype for col, dtype in df.dtypes.items()},
-                        'summary': self._get_summary(df)
-                    },
-                    
-                }
+            try:
+                with pd.ExcelFile(file_path, engine='calamine') as excel_file:
+                    sheet_names = excel_file.sheet_names
+                engine = 'calamine'
+            except Exception as e:
+                logger.debug(f"calamine reader failed for {file_path}, using openpyxl. Error: {e}")
+                with pd.ExcelFile(file_path) as excel_file:
+                    sheet_names = excel_file.sheet_names
+                engine = None
+
+            # Each worker opens the workbook itself so no reader state is shared across threads
+            with ThreadPoolExecutor(max_workers=min(MAX_EXCEL_WORKERS, max(len(sheet_names), 1))) as executor:
+                results = executor.map(lambda name: self._process_sheet(file_path, name, engine), sheet_names)
+                sheets = dict(zip(sheet_names, results))
             
             return {
                 'sheets': sheets,
-                'sheet_names': excel_file.sheet_names
+                'sheet_names': sheet_names
             }
         except Exception as e:
             logger.error(f"Error processing Excel file from path: {file_path}. Error: {e}")
             raise e
+
+    def _process_sheet(self, file_path: str, sheet_name: str, engine: Optional[str] = None) -> Dict[str, Any]:
+        """Process a single sheet of an Excel file and return a dictionary"""
+        try:
+            df = pd.read_excel(file_path, sheet_name=sheet_name, engine=engine)
+        except Exception as e:
+            if engine is None:
+                raise
+            logger.debug(f"{engine} reader failed for sheet {sheet_name} of {file_path}, using openpyxl. Error: {e}")
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
+        return {
+            'data': df, 
+            'metadata': {
+                'rows': df.shape[0],
+                'columns': df.shape[1],
+                'dtypes': df.dtypes.astype(str).to_dict(),
+                'summary': self._get_summary(df)
+            },
+            
+        }
                 
         
     def _process_txt(self, file_path: str) -> Dict[str, Any]:
         """Process a text file and return a dictionary"""
         try:
-            df = pd.read_csv(file_path, sep='\t')
+            df = self._read_csv(file_path, sep='\t')
             logger.info(f"Successfully processed text file from path: {file_path}")
             return {
                 'data': df,
                 'metadata': {
                     'rows': df.shape[0],
                     'columns': df.shape[1],
-                    'dtypes': {col: dtype for col, dtype in df.dtypes.items()},
+                    'dtypes': df.dtypes.astype(str).to_dict(),
                     'summary': self._get_summary(df)
                 },
                 
@@ -102,14 +131,22 @@ class FileProcessor:
     def _process_json(self, file_path: str) -> Dict[str, Any]:
         """Process a JSON file and return a dictionary"""
         try:
-            df = pd.read_json(file_path)
+            if os.path.splitext(file_path)[1] in ('.jsonl', '.ndjson'):
+                # Arrow's reader only handles JSON Lines, regular JSON documents use the default engine
+                try:
+                    df = pd.read_json(file_path, lines=True, engine='pyarrow')
+                except Exception as e:
+                    logger.debug(f"pyarrow JSON reader failed for {file_path}, using default engine. Error: {e}")
+                    df = pd.read_json(file_path, lines=True)
+            else:
+                df = pd.read_json(file_path)
             logger.info(f"Successfully processed JSON file from path: {file_path}")
             return {
                 'data': df,
                 'metadata': {
                     'rows': df.shape[0],
                     'columns': df.shape[1],
-                    'dtypes': {col: dtype for col, dtype in df.dtypes.items()},
+                    'dtypes': df.dtypes.astype(str).to_dict(),
                     'summary': self._get_summary(df)
                 },
                 
@@ -118,22 +155,87 @@ class FileProcessor:
             logger.error(f"Error processing JSON file from path: {file_path}. Error: {e}")
             raise e
         
+    def _process_pdf(self, file_path: str) -> Dict[str, Any]:
+        """Process a PDF file and return a dictionary"""
+        try:
+            # Imported here since only PDF uploads need it
+            import pypdfium2 as pdfium
+
+            # PDFium is not thread-safe, so pages are extracted sequentially
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                pages = []
+                for page in pdf:
+                    textpage = page.get_textpage()
+                    pages.append(textpage.get_text_range())
+                    textpage.close()
+                    page.close()
+            finally:
+                pdf.close()
+            logger.info(f"Successfully processed PDF file from path: {file_path}")
+            return {
+                'text': "\n".join(pages),
+                'metadata': {
+                    'pages': len(pages)
+                }
+            }
+        except Exception as e:
+            logger.error(f"Error processing PDF file from path: {file_path}. Error: {e}")
+            raise e
+
+    def _read_csv(self, file_path: str, **kwargs) -> pd.DataFrame:
+        """Read a delimited file with the multithreaded pyarrow parser, falling back to the default engine"""
+        try:
+            return pd.read_csv(file_path, engine='pyarrow', **kwargs)
+        except Exception as e:
+            logger.debug(f"pyarrow CSV reader failed for {file_path}, using default engine. Error: {e}")
+            return pd.read_csv(file_path, **kwargs)
+
     def _get_summary(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Get summary statistics of the DataFrame"""
+        """Get summary statistics of the DataFrame
+
+        Note: low-cardinality categorical columns of df are converted to the
+        pandas 'category' dtype in place, so plots can reuse the category order.
+        """
         summary = {}
 
-        summary['numeric_columns'] = df.select_dtypes(include=[np.number]).columns.tolist()
+        num_df = df.select_dtypes(include=[np.number])
+        summary['numeric_columns'] = num_df.columns.tolist()
         summary['categorical_columns'] = df.select_dtypes(include=['object', 'bool']).columns.tolist()
         summary['date_columns'] = df.select_dtypes(include=['datetime64']).columns.tolist()
 
-        summary['missing_values'] = df.isnull().sum().to_dict()
-        summary['duplicates'] = df.duplicated().sum()
+        summary['missing_values'] = df.isna().sum().to_dict()
+        # Hashing every row is the most expensive pass, skip it on very large frames
+        if len(df) <= MAX_DUPLICATE_CHECK_ROWS:
+            # Large all-numeric frames use the parallel numba kernel, anything else goes through pandas
+            duplicates = count_duplicate_rows(df)
+            summary['duplicates'] = duplicates if duplicates is not None else int(df.duplicated().sum())
+        else:
+            summary['duplicates'] = None
 
-        try:
-            summary['basic_stats'] = df.describe().to_dict()
-        except Exception as e:
-            logger.error(f"Error getting basic stats: {e}")
+        if num_df.empty:
+            # Text-only frames have no numeric stats to compute
             summary['basic_stats'] = {}
+        else:
+            try:
+                # Same stats as describe(), computed only over the numeric block
+                stats = pd.concat([
+                    num_df.agg(['count', 'mean', 'std', 'min']),
+                    num_df.quantile([0.25, 0.5, 0.75]).rename(index={0.25: '25%', 0.5: '50%', 0.75: '75%'}),
+                    num_df.agg(['max'])
+                ])
+                # Constant columns carry no signal, keep the most variable ones to bound the prompt size
+                std = stats.loc['std']
+                columns = std[std > 0].nlargest(MAX_STATS_COLUMNS).index
+                summary['basic_stats'] = stats[columns].round(3).to_dict()
+            except Exception as e:
+                logger.error(f"Error getting basic stats: {e}")
+                summary['basic_stats'] = {}
+
+        for column in summary['categorical_columns']:
+            # Identifier-like columns (every value unique) gain nothing from a category dtype
+            if df[column].nunique() < min(MAX_CATEGORY_CARDINALITY, len(df)):
+                df[column] = df[column].astype('category')
 
         return summary
     
@@ -1,17 +1,33 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator, Union
+from functools import lru_cache
+import json
 from src.visualization.visualization import VisualizationEngine
 from src.file_processing.process_file import FileProcessor
-from langchain_ollama import ChatOllama
+import ollama
 from src.config.settings import settings
 from loguru import logger
 
+# Maximum number of characters of extracted document text (e.g. PDFs) put into the prompt
+MAX_PROMPT_TEXT_CHARS = 8000
+
+
+@lru_cache(maxsize=None)
+def _get_client(url: str) -> ollama.Client:
+    """Return a process-wide Ollama client shared by every engine/session"""
+    logger.info(f"Creating Ollama client for host: {url}")
+    return ollama.Client(host=url)
+
+
 class DataAnalysisEngine:
     def __init__(self):
-        self.llm = ChatOllama(model=settings.llm_model, ollama_url=settings.ollama_url)
+        self.llm = _get_client(settings.ollama_url)
+        self.model = settings.llm_model
         self.file_processor = FileProcessor()
         self.visualization_engine = VisualizationEngine()
         self.context = {}
         self.data_frames = {}
+        self.numeric_columns = {}
+        self.prompt_snippets = {}
 
     def add_data(self, processed_file_data: Dict[str, Any], file_id: str):
         """Add processed data to the context"""
@@ -21,13 +37,18 @@ class DataAnalysisEngine:
         # If DataFrame is available store it for direct analysis
         if 'data' in processed_file_data:
             self.data_frames[file_id] = processed_file_data['data']
+            self.numeric_columns[file_id] = processed_file_data['metadata']['summary']['numeric_columns']
         elif 'sheets' in processed_file_data:
             for sheet_name, sheet_data in processed_file_data['sheets'].items():
                 self.data_frames[f"{file_id}_{sheet_name}"] = sheet_data['data']
+                self.numeric_columns[f"{file_id}_{sheet_name}"] = sheet_data['metadata']['summary']['numeric_columns']
+
+        # File metadata is fixed after upload, so its prompt context is built once here
+        self.prompt_snippets[file_id] = self._build_prompt_snippet(file_id, processed_file_data)
         logger.info(f"Data added for file: {file_id}")
 
-    def analyze_data(self,  file_ids: List[str], query: str):
-        """Analyze the data based on the query"""
+    def analyze_data(self,  file_ids: List[str], query: str, stream: bool = False) -> Union[str, Iterator[str]]:
+        """Analyze the data based on the query, optionally returning an iterator of text chunks"""
         if not file_ids:
             file_ids = list(self.context.keys())
         logger.info(f"Analyzing data for files: {file_ids}")
@@ -35,9 +56,28 @@ class DataAnalysisEngine:
         # Prepare context for the LLM
         context_text = self._prepare_context(file_ids)
         logger.info(f"Context prepared for files: {file_ids}")
+        prompt = self._build_prompt(context_text, query)
+
+        # Generate the response
+        if stream:
+            return self._stream_response(prompt, file_ids)
 
-        # Prepare the prompt
-        prompt = f"""
+        response = self.chat(prompt)
+        logger.info(f"Response generated for files: {file_ids}")
+        return response
+
+    def chat(self, prompt: str, format: Optional[Union[str, Dict[str, Any]]] = None) -> str:
+        """Send a single prompt to the LLM and return the response text"""
+        response = self.llm.chat(
+            model=self.model,
+            messages=[{'role': 'user', 'content': prompt}],
+            format=format
+        )
+        return response['message']['content']
+
+    def _build_prompt(self, context_text: str, query: str) -> str:
+        """Build the analysis prompt for the given context and question"""
+        return f"""
         You are a professional data analyst, analyze the following data and answer the question based on the context provided.
 
         Context: {context_text}
@@ -51,44 +91,73 @@ class DataAnalysisEngine:
         - If data is insufficient to answer the question, list the information that is needed
         """
 
-        # Generate the response
-        response = self.llm.invoke(prompt)
-        logger.info(f"Response generated for files: {file_ids}")
-        return response.content if hasattr(response, 'content') else str(response)
+    def _stream_response(self, prompt: str, file_ids: List[str]) -> Iterator[str]:
+        """Yield the LLM response text chunk by chunk as it is generated"""
+        chunks = self.llm.chat(
+            model=self.model,
+            messages=[{'role': 'user', 'content': prompt}],
+            stream=True
+        )
+        for chunk in chunks:
+            yield chunk['message']['content']
+        logger.info(f"Response streamed for files: {file_ids}")
     
     def _prepare_context(self, file_ids: List[str]) -> str:
         """Prepare the context for the LLM"""
-        context_parts = []
+        return "\n".join(self.prompt_snippets[file_id] for file_id in file_ids if file_id in self.prompt_snippets)
 
-        for file_id in file_ids:
-            if file_id not in self.context:
-                continue
-
-            data = self.context[file_id]
+    def _build_prompt_snippet(self, file_id: str, data: Dict[str, Any]) -> str:
+        """Build the context text describing a single processed file"""
+        context_parts = []
 
-            if 'data' in data:
-                # CSV, JSON or similar format
-                context_parts.append(f"File: {file_id}")
-                context_parts.append(f"Shape: {data['metadata']['rows']}x{data['metadata']['columns']}")
-                columns = [col for col in data['metadata']['dtypes'].keys()]
-                context_parts.append(f"Columns: {', '.join(columns)}")
-                dtypes_str = ', '.join([f"{col}: {data['metadata']['dtypes'][col]}" for col in columns])
+        if 'data' in data:
+            # CSV, JSON or similar format
+            context_parts.append(f"File: {file_id}")
+            context_parts.append(f"Shape: {data['metadata']['rows']}x{data['metadata']['columns']}")
+            dtypes = data['metadata']['dtypes']
+            context_parts.append(f"Columns: {', '.join(map(str, dtypes))}")
+            dtypes_str = ', '.join(f"{col}: {dtype}" for col, dtype in dtypes.items())
+            context_parts.append(f"Data types: {dtypes_str}")
+            context_parts.append(f"Summary: {self._format_summary(data['metadata']['summary'])}")
+            context_parts.append("-" * 40)
+        elif 'sheets' in data:
+            # Excel format
+            for sheet_name, sheet_data in data['sheets'].items():
+                context_parts.append(f"Sheet: {sheet_name}")
+                context_parts.append(f"Shape: {sheet_data['metadata']['rows']}x{sheet_data['metadata']['columns']}")
+                dtypes = sheet_data['metadata']['dtypes']
+                context_parts.append(f"Columns: {', '.join(map(str, dtypes))}")
+                dtypes_str = ', '.join(f"{col}: {dtype}" for col, dtype in dtypes.items())
                 context_parts.append(f"Data types: {dtypes_str}")
-                context_parts.append(f"Summary: {data['metadata']['summary']}")
+                context_parts.append(f"Summary: {self._format_summary(sheet_data['metadata']['summary'])}")
                 context_parts.append("-" * 40)
-            elif 'sheets' in data:
-                # Excel format
-                for sheet_name, sheet_data in data['sheets'].items():
-                    context_parts.append(f"Sheet: {sheet_name}")
-                    context_parts.append(f"Shape: {sheet_data['metadata']['rows']}x{sheet_data['metadata']['columns']}")
-                    columns = [col for col in sheet_data['metadata']['dtypes'].keys()]
-                    context_parts.append(f"Columns: {', '.join(columns)}")
-                    dtypes_str = ', '.join([f"{col}: {sheet_data['metadata']['dtypes'][col]}" for col in columns])
-                    context_parts.append(f"Data types: {dtypes_str}")
-                    context_parts.append(f"Summary: {sheet_data['metadata']['summary']}")
-                    context_parts.append("-" * 40)
+        elif 'text' in data:
+            # PDF or other free-text format
+            context_parts.append(f"File: {file_id}")
+            context_parts.append(f"Pages: {data['metadata']['pages']}")
+            text = data['text']
+            if len(text) > MAX_PROMPT_TEXT_CHARS:
+                # Keep long documents within the model's context window
+                context_parts.append(f"Text (truncated to the first {MAX_PROMPT_TEXT_CHARS} of {len(text)} characters):")
+                text = text[:MAX_PROMPT_TEXT_CHARS]
+            else:
+                context_parts.append("Text:")
+            context_parts.append(text)
+            context_parts.append("-" * 40)
 
         return "\n".join(context_parts)
+
+    def _format_summary(self, summary: Dict[str, Any]) -> str:
+        """Render a summary as compact JSON to keep the prompt short"""
+        return json.dumps(self._stringify_keys(summary), separators=(',', ':'), default=str)
+
+    def _stringify_keys(self, value: Any) -> Any:
+        """Recursively convert dict keys to strings, column names need not be JSON keys (e.g. Timestamps)"""
+        if isinstance(value, dict):
+            return {str(k): self._stringify_keys(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._stringify_keys(v) for v in value]
+        return value
                 
                 
 
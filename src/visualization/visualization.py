@@ -1,12 +1,22 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import threading
+from functools import lru_cache
 from io import BytesIO
-import base64
 from loguru import logger
 
+
+@lru_cache(maxsize=None)
+def _load_seaborn():
+    """Import seaborn on first use, selecting the backend once for the process"""
+    import matplotlib
+    # Non-interactive backend for the pyplot seaborn pulls in, figures are only rendered to buffers
+    matplotlib.use('Agg')
+    import seaborn as sns
+    return sns
+
+
 class VisualizationEngine:
     """Class for generating visualizations from data"""
 
@@ -15,6 +25,8 @@ class VisualizationEngine:
             'matplotlib': {
                 'figsize': (10, 6),
                 'dpi': 100,
+                'save_dpi': 90,
+                'save_format': 'webp',
                 'style': 'seaborn-v0_8'
             },
             'seaborn': {
@@ -25,6 +37,10 @@ class VisualizationEngine:
                 'template': 'plotly_dark'
             }
         }
+        # A single figure is reused for every render (created on first use), guarded for concurrent requests
+        self._fig = None
+        self._ax = None
+        self._lock = threading.Lock()
     
     def generate_visualization(
         self, 
@@ -34,13 +50,17 @@ class VisualizationEngine:
         y_column: str = None,
         category_column: str = None,
         title: str = None,
-        engine: str = 'seaborn'
+        engine: str = 'seaborn',
+        numeric_columns: Optional[List[str]] = None
     ) -> Dict[str, Any]:
-        """Generate a visualization based on the provided parameters"""
+        """Generate a visualization based on the provided parameters
+
+        numeric_columns can be passed from the file summary to skip re-detecting them.
+        """
         # if engine == 'matplotlib':
         #     return self._matplotlib_viz(df, viz_type, x_column, y_column, category_column, title)
         if engine == 'seaborn':
-            return self._seaborn_viz(df, viz_type, x_column, y_column, category_column, title)
+            return self._seaborn_viz(df, viz_type, x_column, y_column, category_column, title, numeric_columns)
         # elif engine == 'plotly':
         #     return self._plotly_viz(df, viz_type, x_column, y_column, category_column, title)
         else:
@@ -54,84 +74,127 @@ class VisualizationEngine:
         x_column: Optional[str] = None,
         y_column: Optional[str] = None,
         category_column: Optional[str] = None,
-        title: str = "Data Visualization"
+        title: str = "Data Visualization",
+        numeric_columns: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """Generate a seaborn visualization"""
+        with self._lock:
+            return self._render_seaborn(df, viz_type, x_column, y_column, category_column, title, numeric_columns)
+
+    def _category_order(self, df: pd.DataFrame, column: Optional[str]) -> Optional[List[Any]]:
+        """Return the stored category order of a categorical column, so seaborn does not re-sort it"""
+        if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+            return df[column].cat.categories
+        return None
+
+    def _create_figure(self):
+        """Create the shared figure outside pyplot, so it is not tracked (and kept alive) by pyplot's figure manager"""
+        from matplotlib.figure import Figure
+
+        return Figure(
+            figsize=self.default_style['matplotlib']['figsize'],
+            dpi=self.default_style['matplotlib']['dpi']
+        )
+
+    def _render_seaborn(
+        self,
+        df: pd.DataFrame,
+        viz_type: str,
+        x_column: Optional[str] = None,
+        y_column: Optional[str] = None,
+        category_column: Optional[str] = None,
+        title: str = "Data Visualization",
+        numeric_columns: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Draw a seaborn visualization on the shared figure, caller must hold the lock"""
+        sns = _load_seaborn()
+
+        if self._fig is None:
+            self._fig = self._create_figure()
         
         # Set style
         sns.set_style(self.default_style['seaborn']['style'])
         sns.set_palette(self.default_style['seaborn']['palette'])
-        plt.figure(
-            figsize=self.default_style['matplotlib']['figsize'],
-            dpi=self.default_style['matplotlib']['dpi']
-        )
+        # Reset the shared figure (drops colorbars etc.) and pick up the current style
+        self._fig.clf()
+        self._ax = self._fig.add_subplot()
 
         # Bar Chart
         logger.info(f"Generating seaborn visualization for type: {viz_type}")
         if viz_type == 'bar':
             if category_column:
-               ax = sns.barplot(x=x_column, y=y_column, hue=category_column, data=df)
+               ax = sns.barplot(x=x_column, y=y_column, hue=category_column, data=df, order=self._category_order(df, x_column), ax=self._ax)
             else:
-                ax = sns.barplot(x=x_column, y=y_column, data=df)
+                ax = sns.barplot(x=x_column, y=y_column, data=df, order=self._category_order(df, x_column), ax=self._ax)
         
         # Line Chart
         elif viz_type == 'line':
             if category_column:
-                ax = sns.lineplot(x=x_column, y=y_column, hue=category_column, data=df)
+                ax = sns.lineplot(x=x_column, y=y_column, hue=category_column, data=df, ax=self._ax)
             else:
-                ax = sns.lineplot(x=x_column, y=y_column, data=df)
+                ax = sns.lineplot(x=x_column, y=y_column, data=df, ax=self._ax)
 
         # Scatter Plot
         elif viz_type == 'scatter':
             if category_column:
-                ax = sns.scatterplot(x=x_column, y=y_column, hue=category_column, data=df)
+                ax = sns.scatterplot(x=x_column, y=y_column, hue=category_column, data=df, ax=self._ax)
             else:
-                ax = sns.scatterplot(x=x_column, y=y_column, data=df)
+                ax = sns.scatterplot(x=x_column, y=y_column, data=df, ax=self._ax)
 
         # Histogram
         elif viz_type == 'histogram':
-            ax = sns.histplot(x=df[x_column].dropna(), data=df)
+            ax = sns.histplot(x=df[x_column].dropna(), data=df, ax=self._ax)
 
         # Box Plot
         elif viz_type == 'boxplot':
             if category_column:
-                ax = sns.boxplot(x=category_column, y=y_column, data=df)
+                ax = sns.boxplot(x=category_column, y=y_column, data=df, order=self._category_order(df, category_column), ax=self._ax)
             else:
-                ax = sns.boxplot(x=x_column, y=y_column, data=df)
+                ax = sns.boxplot(x=x_column, y=y_column, data=df, order=self._category_order(df, x_column), ax=self._ax)
 
         # Heatmap
         elif viz_type == "heatmap":
             if x_column and y_column and category_column:
-                pivot_df = df.pivot_table(index=y_column, columns=x_column, values=category_column)
-                ax = sns.heatmap(pivot_df, annot=True, cmap="viridis")
+                # Single groupby pass, matching pivot_table's default mean aggregation and dropna=True
+                pivot_df = (
+                    df.groupby([y_column, x_column], observed=True)[category_column].mean()
+                    .unstack(x_column)
+                    .dropna(how='all')
+                    .dropna(axis=1, how='all')
+                )
+                ax = sns.heatmap(pivot_df, annot=True, cmap="viridis", ax=self._ax)
             else:
-                corr_df = df.select_dtypes(include=[np.number]).corr()
-                ax = sns.heatmap(corr_df, annot=True, cmap="coolwarm")
+                numeric_df = df[numeric_columns] if numeric_columns is not None else df.select_dtypes(include=[np.number])
+                corr_df = numeric_df.corr()
+                ax = sns.heatmap(corr_df, annot=True, cmap="coolwarm", ax=self._ax)
 
         # Pie Chart
         elif viz_type == "pie":
             if category_column:
-                ax = sns.pieplot(x=category_column, data=df)
+                ax = sns.pieplot(x=category_column, data=df, ax=self._ax)
             else:
-                ax = sns.pieplot(x=x_column, data=df)
+                ax = sns.pieplot(x=x_column, data=df, ax=self._ax)
                 
         else:
             raise ValueError(f"Unsupported visualization type: {viz_type}")
         
         # Set title
-        plt.title(title)
-        plt.tight_layout()
+        self._ax.set_title(title)
+        self._fig.tight_layout()
 
-        # Convert to base64
+        # Encode to raw image bytes
         buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close()
+        image_format = self.default_style['matplotlib']['save_format']
+        self._fig.savefig(
+            buffer,
+            format=image_format,
+            dpi=self.default_style['matplotlib']['save_dpi'],
+            bbox_inches='tight'
+        )
 
         return {
-            'figure': image_base64,
-            'format': 'base64_png',
+            'figure': buffer.getvalue(),
+            'format': image_format,
             'title': title,
             'type': viz_type,
             'engine': 'seaborn'
@@ -152,9 +215,8 @@ if __name__ == "__main__":
         engine='seaborn'
     )
     image_data = fig['figure']
-    image_data = base64.b64decode(image_data)
-    with open('output.png', 'wb') as f:
+    with open('output.webp', 'wb') as f:
         f.write(image_data)
-    print("Visualization saved as output.png")
+    print("Visualization saved as output.webp")
 
     
\ No newline at end of file